@@ -0,0 +1,122 @@
+"""
+single command line entry point for the tutorial modules
+
+usage examples:
+    python cli.py dynamo scan users --attr age --value 25
+    python cli.py sqs consume --queue test
+    python cli.py --profile-startup cw publish
+
+boto3 and the tutorial module behind a subcommand are only imported once that subcommand
+is invoked, so short cron/Lambda invocations do not pay for the other services;
+--profile-startup reports import and first-call timing on stderr
+"""
+
+import argparse
+import importlib
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+
+def _number_or_str(value):
+    """
+    scan values typed on the command line; DynamoDB compares numbers and strings differently
+    numbers become Decimal, which is what boto3 expects
+    """
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        return value
+    return number if number.is_finite() else value
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='boto3 tutorial operations')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='report import and first-call timing on stderr')
+    services = parser.add_subparsers(dest='service', required=True)
+
+    # each command stores the module and function it runs plus a function mapping args to kwargs
+    dynamo = services.add_parser('dynamo', help='DynamoDB operations (dynamoDB.py)')
+    dynamo_commands = dynamo.add_subparsers(dest='command', required=True)
+
+    scan = dynamo_commands.add_parser('scan', help='scan for items below/above/equal to a value')
+    scan.add_argument('table')
+    scan.add_argument('--attr', default='age')
+    scan.add_argument('--value', type=_number_or_str, required=True)
+    scan.set_defaults(target=('dynamoDB', 'scan_on_attr'),
+                      kargs=lambda a: {'table_name': a.table, 'attr_val': a.value, 'attr': a.attr})
+
+    get = dynamo_commands.add_parser('get', help='get one item by primary key')
+    get.add_argument('table')
+    get.add_argument('username')
+    get.add_argument('last_name')
+    get.set_defaults(target=('dynamoDB', 'get_item'),
+                     kargs=lambda a: {'table_name': a.table, 'user_name': a.username,
+                                      'last_name': a.last_name})
+
+    query = dynamo_commands.add_parser('query', help='query items by username')
+    query.add_argument('table')
+    query.add_argument('username')
+    query.set_defaults(target=('dynamoDB', 'query_on_username'),
+                       kargs=lambda a: {'table_name': a.table, 'user_name': a.username})
+
+    sqs = services.add_parser('sqs', help='SQS operations (dynamo_db_ops.py)')
+    sqs_commands = sqs.add_subparsers(dest='command', required=True)
+
+    consume = sqs_commands.add_parser('consume', help='print and delete waiting messages')
+    consume.add_argument('--queue', default='test')
+    consume.set_defaults(target=('dynamo_db_ops', 'process_message'),
+                         kargs=lambda a: {'queue_name': a.queue})
+
+    send = sqs_commands.add_parser('send', help='send demo messages')
+    send.add_argument('--queue', default='test')
+    send.add_argument('--message', default='hello test')
+    send.set_defaults(target=('dynamo_db_ops', 'send_message'),
+                      kargs=lambda a: {'queue_name': a.queue, 'message': a.message})
+
+    queues = sqs_commands.add_parser('queues', help='list queue urls')
+    queues.set_defaults(target=('dynamo_db_ops', 'print_all_queues'), kargs=lambda a: {})
+
+    cw = services.add_parser('cw', help='CloudWatch operations (market_watch.py)')
+    cw_commands = cw.add_subparsers(dest='command', required=True)
+
+    publish = cw_commands.add_parser('publish', help='publish the PAGES_VISITED demo metric')
+    publish.set_defaults(target=('market_watch', 'publish_metric'), kargs=lambda a: {})
+
+    alarms = cw_commands.add_parser('alarms', help='list alarms with insufficient data')
+    alarms.set_defaults(target=('market_watch', 'print_alarms'), kargs=lambda a: {})
+
+    metrics = cw_commands.add_parser('metrics', help='list IncomingLogEvents metrics')
+    metrics.set_defaults(target=('market_watch', 'list_metrics'), kargs=lambda a: {})
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    module_name, func_name = args.target
+
+    # filled in as startup progresses so a failing run still reports how far it got
+    timings = []
+    start = time.perf_counter()
+    try:
+        importlib.import_module('boto3')
+        boto3_loaded = time.perf_counter()
+        timings.append(('import boto3', boto3_loaded - start))
+        module = importlib.import_module(module_name)
+        module_loaded = time.perf_counter()
+        timings.append((f'import {module_name}', module_loaded - boto3_loaded))
+        try:
+            getattr(module, func_name)(**args.kargs(args))
+        finally:
+            timings.append(('first call', time.perf_counter() - module_loaded))
+    finally:
+        if args.profile_startup:
+            timings.append(('total', time.perf_counter() - start))
+            for label, seconds in timings:
+                print(f'{label:<24}{seconds:.3f}s', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,18 +6,16 @@ import boto3
 from boto3.dynamodb.conditions import Key, Attr
 
 
-def create_table_demo(table_name):
+def users_table_spec(table_name, stream=False):
     """
-    demonstrates use of dynamoDB resource create_table
-    for more on create_table see:
-    https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb.html#DynamoDB.ServiceResource.create_table
-    """
-    dynamodb = boto3.resource('dynamodb')
+    create_table arguments for the users table used throughout this tutorial
 
-    # create table
-    table = dynamodb.create_table(
-        TableName=table_name,
-        KeySchema=[
+    stream=True enables DynamoDB Streams (new and old images) so the table
+    can be mirrored locally, see dynamo_stream_mirror.py
+    """
+    spec = {
+        'TableName': table_name,
+        'KeySchema': [
             {
                 'AttributeName': 'username',
                 'KeyType': 'HASH'
@@ -27,7 +25,7 @@ def create_table_demo(table_name):
                 'KeyType': 'RANGE'
             }
         ],
-        AttributeDefinitions=[
+        'AttributeDefinitions': [
             {
                 'AttributeName': 'username',
                 'AttributeType': 'S'
@@ -37,14 +35,34 @@ def create_table_demo(table_name):
                 'AttributeType': 'S'
             }
         ],
-        ProvisionedThroughput={
+        'ProvisionedThroughput': {
             'ReadCapacityUnits': 5,
             'WriteCapacityUnits': 5
         }
-    )
+    }
+    if stream:
+        spec['StreamSpecification'] = {
+            'StreamEnabled': True,
+            'StreamViewType': 'NEW_AND_OLD_IMAGES'
+        }
+    return spec
+
+
+def create_table_demo(table_name, stream=False):
+    """
+    demonstrates use of dynamoDB resource create_table
+    for more on create_table see:
+    https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb.html#DynamoDB.ServiceResource.create_table
+
+    for creating many tables at once, or reusing existing ones, see table_lifecycle.py
+    """
+    dynamodb = boto3.resource('dynamodb')
+
+    # create table
+    table = dynamodb.create_table(**users_table_spec(table_name, stream))
 
     # wait until table exists
-    table.meta.client.get_waiter('table_exists').wait(TableName='users')
+    table.meta.client.get_waiter('table_exists').wait(TableName=table_name)
 
     # print table data
     print(table.item_count)
@@ -0,0 +1,233 @@
+"""
+client-side write coalescing for DynamoDB.Table.update_item
+
+hot keys that receive many updates per second get throttled on a single partition;
+instead of one update_item round trip per change, UpdateCoalescer buffers pending
+updates per primary key over a short window and merges them into a single update_item
+for more on update expressions see:
+https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/Expressions.UpdateExpressions.html
+"""
+
+import threading
+from concurrent.futures import Future
+from numbers import Number
+
+import boto3
+
+
+class UpdateCoalescer:
+    """
+    buffers SET/ADD actions per primary key and writes them with one update_item per window
+
+    merge rules (applied in call order):
+        SET after SET  -> last value wins
+        ADD after ADD  -> numbers are summed, sets are unioned
+        ADD after SET  -> folded into the pending SET value
+        SET after ADD  -> the SET replaces the pending ADD
+
+    writes to one key are never in flight at the same time, so they land in call order
+    condition_expression (with its names/values) is attached to every merged write; if it
+    fails every caller's future receives the exception
+    """
+
+    def __init__(self, table_name, window=0.05, condition_expression=None,
+                 expression_attribute_names=None, expression_attribute_values=None):
+        dynamodb = boto3.resource('dynamodb')
+        self.table = dynamodb.Table(table_name)
+        self.window = window
+        self.condition_expression = condition_expression
+        self.expression_attribute_names = expression_attribute_names or {}
+        self.expression_attribute_values = expression_attribute_values or {}
+        self._pending = {}
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._closed = False
+
+    def update(self, key, set_attrs=None, add_attrs=None):
+        """
+        queue an update for key; returns a concurrent.futures.Future that resolves
+        with the update_item response once the merged write lands
+
+        ADD values must be numbers or sets, like DynamoDB's ADD action
+        """
+        if not set_attrs and not add_attrs:
+            raise ValueError('update needs set_attrs or add_attrs')
+        for attr, value in (add_attrs or {}).items():
+            if not _addable(value):
+                raise TypeError(f'ADD value for {attr} must be a number or a set, '
+                                f'not {type(value).__name__}')
+
+        future = Future()
+        pkey = tuple(sorted(key.items()))
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('UpdateCoalescer is closed')
+            entry = self._pending.get(pkey)
+            if entry is None:
+                entry = {'key': dict(key), 'set': {}, 'add': {}, 'futures': []}
+            # merge into copies so a failed merge leaves the pending entry untouched
+            merged_set = dict(entry['set'])
+            merged_add = dict(entry['add'])
+            for attr, value in (set_attrs or {}).items():
+                merged_add.pop(attr, None)
+                merged_set[attr] = value
+            for attr, value in (add_attrs or {}).items():
+                if attr in merged_set:
+                    merged_set[attr] = _merge_add(attr, merged_set[attr], value)
+                elif attr in merged_add:
+                    merged_add[attr] = _merge_add(attr, merged_add[attr], value)
+                else:
+                    merged_add[attr] = value
+
+            entry['set'] = merged_set
+            entry['add'] = merged_add
+            entry['futures'].append(future)
+            if pkey not in self._pending:
+                self._pending[pkey] = entry
+                entry['due'] = False
+                entry['timer'] = threading.Timer(self.window, self._flush_key, args=(pkey, entry))
+                entry['timer'].daemon = True
+                entry['timer'].start()
+        return future
+
+    def flush(self):
+        """
+        write every pending key now instead of waiting for its window; keys with a
+        write in flight are sent as soon as that write finishes
+        """
+        with self._lock:
+            pending = list(self._pending.items())
+        for pkey, entry in pending:
+            self._flush_key(pkey, entry)
+
+    def close(self):
+        """
+        flush and wait until every queued update has landed
+        """
+        with self._lock:
+            self._closed = True
+        self.flush()
+        with self._idle:
+            self._idle.wait_for(lambda: not self._pending and not self._in_flight)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _flush_key(self, pkey, entry):
+        """
+        send entry once its window is up; writes to one key never overlap, so an entry
+        that becomes due while the previous write is in flight waits for it
+        """
+        with self._lock:
+            if self._pending.get(pkey) is not entry:
+                return
+            entry['due'] = True
+            entry['timer'].cancel()
+            if pkey in self._in_flight:
+                return
+            del self._pending[pkey]
+            self._in_flight.add(pkey)
+
+        try:
+            while True:
+                self._write(entry)
+                with self._lock:
+                    entry = self._pending.get(pkey)
+                    if entry is None or not entry['due']:
+                        return
+                    del self._pending[pkey]
+        finally:
+            # runs on errors too, so a failed write can never leave the key blocked
+            with self._lock:
+                self._in_flight.discard(pkey)
+                self._idle.notify_all()
+                entry = self._pending.get(pkey)
+                retry = entry is not None and entry['due']
+            if retry:
+                threading.Thread(target=self._flush_key, args=(pkey, entry), daemon=True).start()
+
+    def _write(self, entry):
+        """
+        send entry unless every caller cancelled its future; a cancelled update that was merged
+        with others still lands as part of the merged write
+        """
+        futures = [future for future in entry['futures'] if future.set_running_or_notify_cancel()]
+        if not futures:
+            return
+        try:
+            response = self.table.update_item(Key=entry['key'], **self._build_request(entry))
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future in futures:
+            future.set_result(response)
+
+    def _build_request(self, entry):
+        names = dict(self.expression_attribute_names)
+        values = dict(self.expression_attribute_values)
+        clauses = []
+
+        set_parts = []
+        for i, (attr, value) in enumerate(entry['set'].items()):
+            names[f'#cs{i}'] = attr
+            values[f':cs{i}'] = value
+            set_parts.append(f'#cs{i} = :cs{i}')
+        if set_parts:
+            clauses.append('SET ' + ', '.join(set_parts))
+
+        add_parts = []
+        for i, (attr, value) in enumerate(entry['add'].items()):
+            names[f'#ca{i}'] = attr
+            values[f':ca{i}'] = value
+            add_parts.append(f'#ca{i} :ca{i}')
+        if add_parts:
+            clauses.append('ADD ' + ', '.join(add_parts))
+
+        request = {
+            'UpdateExpression': ' '.join(clauses),
+            'ExpressionAttributeNames': names,
+            'ReturnValues': 'UPDATED_NEW'
+        }
+        if values:
+            request['ExpressionAttributeValues'] = values
+        if self.condition_expression:
+            request['ConditionExpression'] = self.condition_expression
+        return request
+
+
+def _addable(value):
+    if isinstance(value, (set, frozenset)):
+        return True
+    return isinstance(value, Number) and not isinstance(value, bool)
+
+
+def _merge_add(attr, current, value):
+    current_is_set = isinstance(current, (set, frozenset))
+    value_is_set = isinstance(value, (set, frozenset))
+    if current_is_set and value_is_set:
+        return current | value
+    if not current_is_set and not value_is_set and _addable(current):
+        return current + value
+    raise TypeError(f'can not ADD {type(value).__name__} to {type(current).__name__} for {attr}')
+
+
+def coalesced_updates(table_name, user_name, last_name, n=100):
+    """
+    demonstrate n updates on one hot key landing as a single update_item
+    the condition makes sure the merged write never creates a new item
+    """
+    with UpdateCoalescer(table_name, condition_expression='attribute_exists(username)') as coalescer:
+        key = {'username': user_name, 'last_name': last_name}
+        futures = [coalescer.update(key, set_attrs={'age': 40}, add_attrs={'visits': 1})
+                   for _ in range(n)]
+    print(futures[-1].result()['Attributes'])
+
+
+if __name__ == '__main__':
+    table_name = input('enter name of existing table to run coalesced updates on: ')
+    coalesced_updates(table_name, 'Homer_Jay', 'Simpson')
@@ -0,0 +1,228 @@
+"""
+parallel export/import of whole DynamoDB tables to length-prefixed binary files
+
+export_table runs a parallel segmented scan and writes one file per segment; import_table
+streams those files back through concurrent batch writers
+items are kept in the low-level DynamoDB wire format ({'N': '25'}, {'M': {...}}) so numbers
+never go through Decimal and nested maps such as address are written as-is
+for more on parallel scans see:
+https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/Scan.html#Scan.ParallelScan
+
+file layout: MAGIC, records of a 4 byte big-endian length and a compact JSON item, then
+END_MARKER and the 8 byte record count; files without that footer (an export that died
+partway) are rejected before any item is read
+"""
+
+import base64
+import glob
+import json
+import mmap
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+
+MAGIC = b'DDBX2\n'
+LENGTH = struct.Struct('>I')
+END_MARKER = 0xFFFFFFFF
+FOOTER = struct.Struct('>IQ')  # END_MARKER, record count
+BATCH_SIZE = 25  # batch_write_item limit
+
+
+def _encode_default(value):
+    # the client returns B/BS values as bytes
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode('ascii')
+    raise TypeError(f'can not export value of type {type(value).__name__}')
+
+
+def _decode_hook(obj):
+    if len(obj) == 1:
+        if isinstance(obj.get('B'), str):
+            return {'B': base64.b64decode(obj['B'])}
+        if isinstance(obj.get('BS'), list):
+            return {'BS': [base64.b64decode(v) for v in obj['BS']]}
+    return obj
+
+
+def _report(action, items, n_bytes, seconds):
+    stats = {
+        'items': items,
+        'bytes': n_bytes,
+        'seconds': seconds,
+        'items_per_sec': items / seconds if seconds else 0.0,
+        'mb_per_sec': n_bytes / seconds / 1e6 if seconds else 0.0
+    }
+    print(f'{action} {items} items ({n_bytes} bytes) in {seconds:.2f}s: '
+          f'{stats["items_per_sec"]:.0f} items/s, {stats["mb_per_sec"]:.2f} MB/s')
+    return stats
+
+
+def segment_path(out_dir, table_name, segment):
+    return os.path.join(out_dir, f'{table_name}-{segment:04d}.ddbx')
+
+
+def segment_paths(in_dir, table_name):
+    """
+    the export files of exactly table_name in in_dir (not e.g. those of table_name-archive)
+    """
+    pattern = f'{glob.escape(table_name)}-[0-9][0-9][0-9][0-9].ddbx'
+    return sorted(glob.glob(os.path.join(glob.escape(in_dir), pattern)))
+
+
+def _export_segment(client, table_name, path, segment, total_segments):
+    items = 0
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        paginator = client.get_paginator('scan')
+        for page in paginator.paginate(TableName=table_name, Segment=segment,
+                                       TotalSegments=total_segments):
+            for item in page['Items']:
+                data = json.dumps(item, separators=(',', ':'), default=_encode_default).encode('utf-8')
+                f.write(LENGTH.pack(len(data)))
+                f.write(data)
+                items += 1
+        f.write(FOOTER.pack(END_MARKER, items))
+        n_bytes = f.tell()
+    return items, n_bytes
+
+
+def export_table(table_name, out_dir='.', total_segments=4):
+    """
+    parallel segmented scan of table_name into total_segments files in out_dir
+    returns throughput stats
+
+    segments are written to .tmp files and only replace an earlier export of table_name
+    once every segment succeeded, so a failed export leaves the previous one intact
+    """
+    client = boto3.client('dynamodb')
+    os.makedirs(out_dir, exist_ok=True)
+    paths = [segment_path(out_dir, table_name, segment) for segment in range(total_segments)]
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=total_segments) as executor:
+            futures = [executor.submit(_export_segment, client, table_name, path + '.tmp',
+                                       segment, total_segments)
+                       for segment, path in enumerate(paths)]
+            results = [future.result() for future in futures]
+    except BaseException:
+        for path in paths:
+            if os.path.exists(path + '.tmp'):
+                os.remove(path + '.tmp')
+        raise
+    for path in paths:
+        os.replace(path + '.tmp', path)
+    # a previous export with more segments would otherwise leave files behind for import_table
+    for path in segment_paths(out_dir, table_name):
+        if path not in paths:
+            os.remove(path)
+    seconds = time.perf_counter() - start
+
+    return _report('exported', sum(r[0] for r in results), sum(r[1] for r in results), seconds)
+
+
+def _iter_records(buf):
+    end = len(buf) - FOOTER.size
+    if buf[:len(MAGIC)] != MAGIC or end < len(MAGIC):
+        raise ValueError('not a table export file')
+    marker, count = FOOTER.unpack_from(buf, end)
+    if marker != END_MARKER:
+        raise ValueError('incomplete table export file (no end marker)')
+
+    offset = len(MAGIC)
+    records = 0
+    while offset < end:
+        (size,) = LENGTH.unpack_from(buf, offset)
+        offset += LENGTH.size
+        if offset + size > end:
+            raise ValueError('corrupt table export file (record runs past end marker)')
+        yield buf[offset:offset + size]
+        offset += size
+        records += 1
+    if records != count:
+        raise ValueError(f'corrupt table export file ({records} records, footer says {count})')
+
+
+def read_export(path, use_mmap=True, deserialize=False):
+    """
+    yield the items of one export file in wire format, or as python types
+    (like the resource layer returns) with deserialize=True
+    """
+    deserializer = TypeDeserializer()
+    with open(path, 'rb') as f:
+        if use_mmap and os.fstat(f.fileno()).st_size:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buf = f.read()
+        try:
+            for record in _iter_records(buf):
+                item = json.loads(record, object_hook=_decode_hook)
+                if deserialize:
+                    item = {k: deserializer.deserialize(v) for k, v in item.items()}
+                yield item
+        finally:
+            if isinstance(buf, mmap.mmap):
+                buf.close()
+
+
+def _write_batch(client, table_name, items, max_retries):
+    request = {table_name: [{'PutRequest': {'Item': item}} for item in items]}
+    for attempt in range(max_retries):
+        response = client.batch_write_item(RequestItems=request)
+        request = response.get('UnprocessedItems')
+        if not request:
+            return
+        time.sleep(min(0.05 * 2 ** attempt, 2.0))
+    raise RuntimeError(f'{len(request[table_name])} items still unprocessed after {max_retries} retries')
+
+
+def batch_write_items(client, table_name, items, max_retries=8):
+    """
+    put wire-format items in batch_write_item sized batches, retrying UnprocessedItems
+    with backoff; returns the number of items written
+    """
+    written = 0
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == BATCH_SIZE:
+            _write_batch(client, table_name, batch, max_retries)
+            written += len(batch)
+            batch = []
+    if batch:
+        _write_batch(client, table_name, batch, max_retries)
+        written += len(batch)
+    return written
+
+
+def _import_file(client, table_name, path, use_mmap):
+    items = batch_write_items(client, table_name, read_export(path, use_mmap=use_mmap))
+    return items, os.path.getsize(path)
+
+
+def import_table(table_name, in_dir='.', source_table=None, max_workers=4, use_mmap=True):
+    """
+    write every export file of source_table (default table_name) in in_dir into table_name
+    using one concurrent batch writer per file; returns throughput stats
+    """
+    client = boto3.client('dynamodb')
+    paths = segment_paths(in_dir, source_table or table_name)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_import_file, client, table_name, path, use_mmap) for path in paths]
+        results = [future.result() for future in futures]
+    seconds = time.perf_counter() - start
+
+    return _report('imported', sum(r[0] for r in results), sum(r[1] for r in results), seconds)
+
+
+if __name__ == '__main__':
+    table_name = input('enter table name to export: ')
+    copy_name = input('enter existing table name to import the export into: ')
+    export_table(table_name, 'exports')
+    import_table(copy_name, 'exports', source_table=table_name)
@@ -0,0 +1,279 @@
+"""
+incremental local mirror of a DynamoDB table fed by DynamoDB Streams
+
+the table must have streams enabled, e.g. created with create_table_demo(table_name, stream=True);
+shards are consumed in parallel and every change is applied to an in-memory replica that keeps
+secondary hash indexes on chosen attributes, so lookups such as the more_scans examples on
+account_type or address.state are served locally instead of by a full-table scan
+for more on DynamoDB Streams see:
+https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodbstreams.html
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+
+
+def _resolve(item, attr):
+    """
+    follow a dotted attribute path such as 'address.state'; returns None when missing
+    """
+    value = item
+    for part in attr.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+class StreamMirror:
+    """
+    in-memory replica of table_name kept up to date from its stream
+
+    index_attrs: attribute paths to keep hash indexes on (dotted paths reach into maps)
+    """
+
+    def __init__(self, table_name, index_attrs=('account_type', 'address.state'),
+                 poll_interval=1.0, max_workers=8, max_backoff=30.0):
+        dynamodb = boto3.resource('dynamodb')
+        self.table = dynamodb.Table(table_name)
+        self.streams = boto3.client('dynamodbstreams')
+        self.stream_arn = self.table.latest_stream_arn
+        stream = self.table.stream_specification or {}
+        if not self.stream_arn or not stream.get('StreamEnabled'):
+            raise ValueError(f'table "{table_name}" does not have streams enabled')
+        # the mirror is rebuilt from NewImage, so the stream has to carry it
+        if stream.get('StreamViewType') not in ('NEW_IMAGE', 'NEW_AND_OLD_IMAGES'):
+            raise ValueError(f'table "{table_name}" has a {stream.get("StreamViewType")} stream; '
+                             f'NEW_IMAGE or NEW_AND_OLD_IMAGES is needed')
+        self.key_names = [k['AttributeName'] for k in self.table.key_schema]
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+
+        self.items = {}
+        self.indexes = {attr: {} for attr in index_attrs}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._started = set()
+        self._finished = set()
+        self._initial_iterators = {}
+        self._coordinator = None
+        self._deserializer = TypeDeserializer()
+        # latest error per shard id (or 'describe_stream'); cleared once that part recovers
+        self.errors = {}
+
+    def start(self, bootstrap=True):
+        """
+        bootstrap=True takes LATEST iterators on the open shards, then loads the table with a
+        scan and follows the stream from those iterators; only changes made while the scan
+        runs are replayed over it, so lookups may be stale for about the duration of the scan
+        (longer if the scan outlasts the 15 minute iterator lifetime, in which case the shard
+        is replayed from TRIM_HORIZON)
+
+        bootstrap=False rebuilds the mirror from the stream alone, starting at TRIM_HORIZON;
+        that is only complete for tables whose whole history is still in the stream (24 hours)
+        and lookups are stale until the replay catches up
+        """
+        if bootstrap:
+            for shard in self._list_shards():
+                shard_id = shard['ShardId']
+                if 'EndingSequenceNumber' in shard['SequenceNumberRange']:
+                    # closed shards only hold changes the scan already sees
+                    self._started.add(shard_id)
+                    self._finished.add(shard_id)
+                    continue
+                self._initial_iterators[shard_id] = self.streams.get_shard_iterator(
+                    StreamArn=self.stream_arn,
+                    ShardId=shard_id,
+                    ShardIteratorType='LATEST'
+                )['ShardIterator']
+
+            kargs = {}
+            while True:
+                response = self.table.scan(**kargs)
+                for item in response['Items']:
+                    self._put(item)
+                if 'LastEvaluatedKey' not in response:
+                    break
+                kargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        self._coordinator = threading.Thread(target=self._coordinate, daemon=True)
+        self._coordinator.start()
+        return self
+
+    @property
+    def healthy(self):
+        """
+        False when the mirror may be stale: the coordinator died or a shard/describe_stream
+        call is failing and being retried (see errors)
+        """
+        coordinator_alive = self._coordinator is not None and self._coordinator.is_alive()
+        return coordinator_alive and not self.errors
+
+    def stop(self):
+        self._stop.set()
+        if self._coordinator:
+            self._coordinator.join()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def get(self, key):
+        with self._lock:
+            return self.items.get(self._pkey(key))
+
+    def lookup(self, attr, value):
+        """
+        items whose attr equals value, served from the local hash index
+        check healthy to know whether the mirror is keeping up with the table
+        """
+        with self._lock:
+            return [self.items[pkey] for pkey in self.indexes[attr].get(value, ())]
+
+    def _pkey(self, item):
+        return tuple(item[name] for name in self.key_names)
+
+    def _put(self, item):
+        pkey = self._pkey(item)
+        with self._lock:
+            self._remove(pkey)
+            self.items[pkey] = item
+            for attr, index in self.indexes.items():
+                value = _resolve(item, attr)
+                try:
+                    index.setdefault(value, set()).add(pkey)
+                except TypeError:
+                    # maps, lists and sets can not be hash indexed
+                    pass
+
+    def _remove(self, pkey):
+        with self._lock:
+            old = self.items.pop(pkey, None)
+            if old is None:
+                return
+            for attr, index in self.indexes.items():
+                value = _resolve(old, attr)
+                try:
+                    bucket = index.get(value)
+                except TypeError:
+                    continue
+                if bucket is not None:
+                    bucket.discard(pkey)
+                    if not bucket:
+                        del index[value]
+
+    def _apply(self, record):
+        change = record['dynamodb']
+        if record['eventName'] == 'REMOVE':
+            keys = {k: self._deserializer.deserialize(v) for k, v in change['Keys'].items()}
+            self._remove(self._pkey(keys))
+        else:
+            item = {k: self._deserializer.deserialize(v) for k, v in change['NewImage'].items()}
+            self._put(item)
+
+    def _list_shards(self):
+        shards = []
+        kargs = {'StreamArn': self.stream_arn}
+        while True:
+            description = self.streams.describe_stream(**kargs)['StreamDescription']
+            shards.extend(description['Shards'])
+            if 'LastEvaluatedShardId' not in description:
+                return shards
+            kargs['ExclusiveStartShardId'] = description['LastEvaluatedShardId']
+
+    def _backoff(self, failures):
+        return min(self.poll_interval * 2 ** failures, self.max_backoff)
+
+    def _coordinate(self):
+        """
+        hand shards to the worker pool; a child shard only starts once its parent
+        is drained so changes to a key are applied in order
+        """
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                shards = self._list_shards()
+            except Exception as e:
+                self.errors['describe_stream'] = e
+                self._stop.wait(self._backoff(failures))
+                failures += 1
+                continue
+            self.errors.pop('describe_stream', None)
+            failures = 0
+
+            known = {shard['ShardId'] for shard in shards}
+            for shard in shards:
+                shard_id = shard['ShardId']
+                parent = shard.get('ParentShardId')
+                if shard_id in self._started:
+                    continue
+                if parent in known and parent not in self._finished:
+                    continue
+                self._started.add(shard_id)
+                self._executor.submit(self._consume_shard, shard_id)
+            self._stop.wait(self.poll_interval)
+
+    def _shard_iterator(self, shard_id, sequence_number):
+        if sequence_number is not None:
+            kargs = {'ShardIteratorType': 'AFTER_SEQUENCE_NUMBER', 'SequenceNumber': sequence_number}
+        else:
+            kargs = {'ShardIteratorType': 'TRIM_HORIZON'}
+        return self.streams.get_shard_iterator(StreamArn=self.stream_arn, ShardId=shard_id,
+                                               **kargs)['ShardIterator']
+
+    def _consume_shard(self, shard_id):
+        """
+        follow one shard until it is closed and drained; failed calls (expired iterators,
+        throttling, ...) and records that fail to apply are retried with backoff from the
+        last applied sequence number
+        """
+        iterator = self._initial_iterators.pop(shard_id, None)
+        sequence_number = None
+        failures = 0
+
+        while not self._stop.is_set():
+            try:
+                if iterator is None:
+                    iterator = self._shard_iterator(shard_id, sequence_number)
+                response = self.streams.get_records(ShardIterator=iterator)
+                for record in response['Records']:
+                    self._apply(record)
+                    sequence_number = record['dynamodb']['SequenceNumber']
+            except Exception as e:
+                self.errors[shard_id] = e
+                iterator = None
+                self._stop.wait(self._backoff(failures))
+                failures += 1
+                continue
+            self.errors.pop(shard_id, None)
+            failures = 0
+
+            iterator = response.get('NextShardIterator')
+            if not iterator:
+                self._finished.add(shard_id)
+                return
+            if not response['Records']:
+                self._stop.wait(self.poll_interval)
+
+
+def mirrored_lookups(table_name, account_type='super_user', state='CA'):
+    """
+    local equivalents of the more_scans examples; table must be created with stream=True
+    """
+    with StreamMirror(table_name) as mirror:
+        print(f'mirrored users with account type {account_type}')
+        print(mirror.lookup('account_type', account_type))
+        print(f'mirrored users with address.state equal to {state}')
+        print(mirror.lookup('address.state', state))
+
+
+if __name__ == '__main__':
+    table_name = input('enter name of existing stream-enabled table to mirror: ')
+    mirrored_lookups(table_name)
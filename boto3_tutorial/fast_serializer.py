@@ -0,0 +1,323 @@
+"""
+faster replacement for boto3's TypeSerializer/TypeDeserializer on bulk paths
+
+boto3's resource layer converts every attribute with a chain of isinstance checks; on big
+nested items (like the address maps in dynamoDB.py) that dominates CPU for scans and batch
+writes. this module converts with type-dispatch tables instead, can optionally use float in
+place of Decimal, and can compile a converter for a known item shape
+scan_items/batch_put_items use it with the low-level client and return/accept the same
+python values as the resource layer
+for boto3's serializer see:
+https://boto3.amazonaws.com/v1/documentation/api/latest/reference/customizations/dynamodb.html#boto3.dynamodb.types.TypeSerializer
+"""
+
+import math
+import time
+from collections.abc import Mapping, Set
+from decimal import Decimal
+
+import boto3
+from boto3.dynamodb.types import DYNAMODB_CONTEXT, Binary, TypeDeserializer, TypeSerializer
+
+from dynamo_export import batch_write_items
+
+_MAX_EXACT_INT = 10 ** 38
+
+# shape of the items written by dynamoDB.batch_writing
+USERS_ITEM_SHAPE = {
+    'account_type': 'S',
+    'username': 'S',
+    'first_name': 'S',
+    'last_name': 'S',
+    'age': 'N',
+    'address': {
+        'road': 'S',
+        'city': 'S',
+        'state': 'S',
+        'zipcode': 'N'
+    }
+}
+
+
+class FastSerializer:
+    """
+    python value -> DynamoDB wire format
+    float_mode=True accepts floats as numbers (boto3 only accepts Decimal and int)
+    """
+
+    def __init__(self, float_mode=False):
+        self.float_mode = float_mode
+        self._dispatch = {
+            str: lambda v: {'S': v},
+            bool: lambda v: {'BOOL': v},
+            int: lambda v: {'N': _int_number(v)},
+            Decimal: self._decimal,
+            float: self._float,
+            type(None): lambda v: {'NULL': True},
+            bytes: lambda v: {'B': v},
+            bytearray: lambda v: {'B': bytes(v)},
+            Binary: lambda v: {'B': v.value},
+            dict: self._map,
+            list: self._list,
+            tuple: self._list,
+            set: self._set,
+            frozenset: self._set
+        }
+
+    def serialize(self, value):
+        convert = self._dispatch.get(type(value))
+        if convert is None:
+            convert = self._lookup(type(value))
+        return convert(value)
+
+    def serialize_item(self, item):
+        dispatch = self._dispatch
+        result = {}
+        for key, value in item.items():
+            convert = dispatch.get(type(value)) or self._lookup(type(value))
+            result[key] = convert(value)
+        return result
+
+    def _lookup(self, cls):
+        # subclasses and abstract containers; cache the result for the next value of cls
+        for base in cls.__mro__:
+            if base in self._dispatch:
+                break
+        else:
+            if issubclass(cls, Mapping):
+                base = dict
+            elif issubclass(cls, Set):
+                base = set
+            else:
+                raise TypeError(f'Unsupported type "{cls}" for value')
+        self._dispatch[cls] = self._dispatch[base]
+        return self._dispatch[cls]
+
+    def _decimal(self, value):
+        if not value.is_finite():
+            raise TypeError('Infinity and NaN not supported')
+        return {'N': str(DYNAMODB_CONTEXT.create_decimal(value))}
+
+    def _float(self, value):
+        if not self.float_mode:
+            raise TypeError('Float types are not supported. Use Decimal types instead.')
+        if math.isinf(value) or math.isnan(value):
+            raise TypeError('Infinity and NaN not supported')
+        return {'N': repr(value)}
+
+    def _number(self, value):
+        return self.serialize(value)['N']
+
+    def _map(self, value):
+        return {'M': self.serialize_item(value)}
+
+    def _list(self, value):
+        serialize = self.serialize
+        return {'L': [serialize(v) for v in value]}
+
+    def _set(self, value):
+        if not value:
+            raise TypeError('empty sets can not be stored in DynamoDB')
+        first = next(iter(value))
+        if isinstance(first, str):
+            return {'SS': list(value)}
+        if isinstance(first, (bytes, bytearray, Binary)):
+            return {'BS': [self.serialize(v)['B'] for v in value]}
+        return {'NS': [self._number(v) for v in value]}
+
+
+class FastDeserializer:
+    """
+    DynamoDB wire format -> python value
+    float_mode=True returns int/float for numbers instead of Decimal
+    """
+
+    def __init__(self, float_mode=False):
+        self.float_mode = float_mode
+        self._number = _fast_number if float_mode else Decimal
+        self._dispatch = {
+            'S': lambda v: v,
+            'N': self._number,
+            'BOOL': lambda v: v,
+            'NULL': lambda v: None,
+            'B': Binary,
+            'M': self.deserialize_item,
+            'L': self._list,
+            'SS': set,
+            'NS': lambda v: set(map(self._number, v)),
+            'BS': lambda v: set(map(Binary, v))
+        }
+
+    def deserialize(self, value):
+        ((tag, inner),) = value.items()
+        return self._dispatch[tag](inner)
+
+    def deserialize_item(self, item):
+        dispatch = self._dispatch
+        result = {}
+        for key, value in item.items():
+            ((tag, inner),) = value.items()
+            result[key] = dispatch[tag](inner)
+        return result
+
+    def _list(self, value):
+        deserialize = self.deserialize
+        return [deserialize(v) for v in value]
+
+
+def _int_number(value):
+    """
+    ints of up to 38 digits are exact in DynamoDB; larger ones get boto3's
+    DYNAMODB_CONTEXT treatment (which raises when they would be rounded)
+    """
+    if -_MAX_EXACT_INT < value < _MAX_EXACT_INT:
+        return str(value)
+    return str(DYNAMODB_CONTEXT.create_decimal(value))
+
+
+def _fast_number(value):
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+# per-hint expressions for compiled converters; {v} is the local holding the value
+_SERIALIZE_HINTS = {
+    'S': "{{'S': {v}}} if type({v}) is str else generic({v})",
+    'N': "{{'N': str({v})}} if type({v}) is int and -max_int < {v} < max_int else generic({v})",
+    'BOOL': "{{'BOOL': {v}}} if type({v}) is bool else generic({v})",
+    'M': "{{'M': {convert}({v})}} if type({v}) is dict else generic({v})"
+}
+_DESERIALIZE_HINTS = {
+    'S': "{v}['S'] if 'S' in {v} else generic({v})",
+    'N': "number({v}['N']) if 'N' in {v} else generic({v})",
+    'BOOL': "{v}['BOOL'] if 'BOOL' in {v} else generic({v})",
+    'M': "{convert}({v}['M']) if 'M' in {v} else generic({v})"
+}
+
+
+def _compile(name, shape, templates, namespace, compile_nested):
+    """
+    generate a function converting one item of shape with the known attributes unrolled:
+    it reads each attribute into a local and returns a single dict display; items whose
+    keys are not exactly those of shape (a missing one, or one too many) go to
+    namespace['fallback']
+    """
+    lines = [f'def {name}(item):',
+             f'    if len(item) != {len(shape)}:',
+             '        return fallback(item)',
+             '    try:']
+    entries = []
+    for i, (attr, hint) in enumerate(shape.items()):
+        convert = None
+        if isinstance(hint, dict):
+            convert = f'convert{i}'
+            namespace[convert] = compile_nested(hint)
+            hint = 'M'
+        elif hint not in templates or hint == 'M':
+            # maps are given as nested shapes, not as 'M'
+            raise ValueError(f'unsupported shape hint "{hint}" for {attr}')
+        lines.append(f'        v{i} = item[{attr!r}]')
+        entries.append(f'        {attr!r}: ' + templates[hint].format(v=f'v{i}', convert=convert))
+    lines += ['    except KeyError:', '        return fallback(item)',
+              '    return {', ',\n'.join(entries), '    }']
+    exec('\n'.join(lines), namespace)
+    return namespace[name]
+
+
+def compile_serializer(shape, float_mode=False):
+    """
+    build an item serializer for items shaped like shape ({attr: 'S' | 'N' | 'BOOL' | nested shape})
+    items with other attributes, or whose values do not match the shape, use FastSerializer
+    """
+    serializer = FastSerializer(float_mode)
+    namespace = {'generic': serializer.serialize, 'fallback': serializer.serialize_item,
+                 'max_int': _MAX_EXACT_INT}
+    return _compile('serialize_item', shape, _SERIALIZE_HINTS, namespace,
+                    lambda hint: compile_serializer(hint, float_mode))
+
+
+def compile_deserializer(shape, float_mode=False):
+    """
+    build an item deserializer for items shaped like shape, see compile_serializer
+    """
+    deserializer = FastDeserializer(float_mode)
+    namespace = {'generic': deserializer.deserialize, 'fallback': deserializer.deserialize_item,
+                 'number': _fast_number if float_mode else Decimal}
+    return _compile('deserialize_item', shape, _DESERIALIZE_HINTS, namespace,
+                    lambda hint: compile_deserializer(hint, float_mode))
+
+
+def scan_items(table_name, deserialize_item=None, **kargs):
+    """
+    yield every item of a (filtered) scan as python values, like DynamoDB.Table.scan would
+    kargs are low-level client scan arguments
+    """
+    client = boto3.client('dynamodb')
+    deserialize_item = deserialize_item or FastDeserializer().deserialize_item
+    paginator = client.get_paginator('scan')
+    for page in paginator.paginate(TableName=table_name, **kargs):
+        for item in page['Items']:
+            yield deserialize_item(item)
+
+
+def batch_put_items(table_name, items, serialize_item=None, max_retries=8):
+    """
+    put python-valued items with batch_write_item, like DynamoDB.Table.batch_writer would
+    """
+    client = boto3.client('dynamodb')
+    serialize_item = serialize_item or FastSerializer().serialize_item
+    batch_write_items(client, table_name, map(serialize_item, items), max_retries)
+
+
+def _bench_items(n):
+    return [
+        {
+            'account_type': 'standard_user',
+            'username': f'user_{i}',
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'age': i % 90,
+            'address': {
+                'road': f'{i} Jefferson Street',
+                'city': 'Los Angeles',
+                'state': 'CA',
+                'zipcode': 90001
+            }
+        }
+        for i in range(n)
+    ]
+
+
+def benchmark(n=100000):
+    """
+    compare boto3's TypeSerializer/TypeDeserializer with the fast paths on n users-shaped items
+    """
+    items = _bench_items(n)
+    boto_serializer = TypeSerializer()
+    boto_deserializer = TypeDeserializer()
+
+    def timed(label, func, data):
+        start = time.perf_counter()
+        result = [func(item) for item in data]
+        seconds = time.perf_counter() - start
+        print(f'{label:<40} {seconds:6.3f}s  {n / seconds:10.0f} items/s')
+        return result
+
+    wire = timed('serialize: boto3 TypeSerializer',
+                 lambda item: {k: boto_serializer.serialize(v) for k, v in item.items()}, items)
+    timed('serialize: FastSerializer', FastSerializer().serialize_item, items)
+    timed('serialize: compiled USERS_ITEM_SHAPE', compile_serializer(USERS_ITEM_SHAPE), items)
+
+    timed('deserialize: boto3 TypeDeserializer',
+          lambda item: {k: boto_deserializer.deserialize(v) for k, v in item.items()}, wire)
+    timed('deserialize: FastDeserializer', FastDeserializer().deserialize_item, wire)
+    timed('deserialize: FastDeserializer float_mode', FastDeserializer(float_mode=True).deserialize_item, wire)
+    timed('deserialize: compiled USERS_ITEM_SHAPE', compile_deserializer(USERS_ITEM_SHAPE), wire)
+    timed('deserialize: compiled float_mode',
+          compile_deserializer(USERS_ITEM_SHAPE, float_mode=True), wire)
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,238 @@
+"""
+adaptive CloudWatch alarm thresholds from rolling statistics
+
+create_alarm in market_watch.py uses a static Threshold=70.0, which under real load either
+fires constantly or never; MetricAnomalyDetector pulls datapoints for the metrics found by
+list_metrics, keeps O(1)-update rolling mean/variance in an array-backed ring buffer plus a
+sorted copy of the same window for quantiles, and only calls put_metric_alarm when the
+derived threshold drifts meaningfully from the one last pushed
+for more on get_metric_data see:
+https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/cloudwatch.html#CloudWatch.Client.get_metric_data
+"""
+
+import bisect
+import math
+import re
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+
+import boto3
+
+MAX_QUERIES = 500  # get_metric_data limit per call
+
+
+class RollingStats:
+    """
+    mean, variance and quantiles over the last window values
+    mean/variance update in O(1); the sorted copy used for quantiles costs a bisect plus a
+    short memmove per add
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.values = array('d', bytes(8 * window))
+        self.count = 0
+        self.index = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._sorted = array('d')
+
+    def add(self, x):
+        if self.count < self.window:
+            self.count += 1
+            delta = x - self.mean
+            self.mean += delta / self.count
+            self._m2 += delta * (x - self.mean)
+        else:
+            # replace the oldest value (sliding Welford update)
+            old = self.values[self.index]
+            old_mean = self.mean
+            self.mean += (x - old) / self.window
+            self._m2 += (x - old) * (x - self.mean + old - old_mean)
+            del self._sorted[bisect.bisect_left(self._sorted, old)]
+        bisect.insort(self._sorted, x)
+        self.values[self.index] = x
+        self.index = (self.index + 1) % self.window
+
+    @property
+    def variance(self):
+        if self.count < 2:
+            return 0.0
+        return max(self._m2, 0.0) / (self.count - 1)
+
+    @property
+    def stddev(self):
+        return math.sqrt(self.variance)
+
+    def quantile(self, p):
+        """
+        nearest-rank p-quantile of the values currently in the window
+        """
+        if not self._sorted:
+            return 0.0
+        rank = math.ceil(p * len(self._sorted)) - 1
+        return self._sorted[min(max(rank, 0), len(self._sorted) - 1)]
+
+
+class MetricAnomalyDetector:
+    """
+    keeps per-metric rolling statistics and pushes adaptive alarm thresholds
+
+    threshold = max(mean + k * stddev, quantile), both over the last window datapoints; it is
+    pushed with put_metric_alarm once min_samples datapoints are in and then only when it moves
+    by more than drift (relative) from the last pushed value
+    """
+
+    def __init__(self, list_metrics_args=None, window=60, quantile=0.99, k=3.0, drift=0.1,
+                 period=60, statistic='Average', min_samples=10, alarm_prefix='adaptive-',
+                 settle_periods=1):
+        self.cloudwatch = boto3.client('cloudwatch')
+        self.list_metrics_args = list_metrics_args or {'Namespace': 'AWS/EC2',
+                                                       'MetricName': 'CPUUtilization'}
+        self.window = window
+        self.quantile = quantile
+        self.k = k
+        self.drift = drift
+        self.period = period
+        self.statistic = statistic
+        self.min_samples = min_samples
+        self.alarm_prefix = alarm_prefix
+        self.settle_periods = settle_periods
+
+        self.metrics = []
+        self.stats = {}
+        self.last_seen = {}
+        self.pushed = {}
+        self.api_calls = 0
+
+    @staticmethod
+    def _metric_key(metric):
+        dimensions = tuple(sorted((d['Name'], d['Value']) for d in metric.get('Dimensions', [])))
+        return metric['Namespace'], metric['MetricName'], dimensions
+
+    def discover(self):
+        """
+        find metrics to watch with the list_metrics paginator (see market_watch.list_metrics)
+        """
+        paginator = self.cloudwatch.get_paginator('list_metrics')
+        for response in paginator.paginate(**self.list_metrics_args):
+            self.api_calls += 1
+            for metric in response['Metrics']:
+                key = self._metric_key(metric)
+                if key not in self.stats:
+                    self.metrics.append(metric)
+                    self.stats[key] = RollingStats(self.window)
+        return self.metrics
+
+    def poll(self, lookback=None):
+        """
+        pull datapoints newer than the last ones seen for every watched metric
+
+        only complete periods are read: EndTime is floored to a period boundary and then moved
+        back settle_periods periods so late-arriving datapoints are in before a period is read
+        (a period once read is never read again)
+        """
+        now = datetime.now(timezone.utc)
+        boundary = math.floor(now.timestamp() / self.period) * self.period
+        end = datetime.fromtimestamp(boundary - self.settle_periods * self.period, timezone.utc)
+        lookback = lookback or timedelta(seconds=self.period * self.window)
+        for offset in range(0, len(self.metrics), MAX_QUERIES):
+            chunk = self.metrics[offset:offset + MAX_QUERIES]
+            keys = [self._metric_key(metric) for metric in chunk]
+            start = min(self.last_seen.get(key, end - lookback) for key in keys)
+            if start >= end:
+                continue
+            queries = [
+                {
+                    'Id': f'm{i}',
+                    'MetricStat': {
+                        'Metric': metric,
+                        'Period': self.period,
+                        'Stat': self.statistic
+                    }
+                }
+                for i, metric in enumerate(chunk)
+            ]
+            paginator = self.cloudwatch.get_paginator('get_metric_data')
+            for response in paginator.paginate(MetricDataQueries=queries, StartTime=start,
+                                               EndTime=end, ScanBy='TimestampAscending'):
+                self.api_calls += 1
+                for result in response['MetricDataResults']:
+                    self._add(keys[int(result['Id'][1:])], result['Timestamps'], result['Values'])
+
+    def _add(self, key, timestamps, values):
+        last = self.last_seen.get(key)
+        stats = self.stats[key]
+        for timestamp, value in sorted(zip(timestamps, values)):
+            if last is not None and timestamp <= last:
+                continue
+            stats.add(value)
+            last = timestamp
+        if last is not None:
+            self.last_seen[key] = last
+
+    def threshold(self, key):
+        stats = self.stats[key]
+        return max(stats.mean + self.k * stats.stddev, stats.quantile(self.quantile))
+
+    def alarm_name(self, key):
+        namespace, metric_name, dimensions = key
+        name = '-'.join([namespace, metric_name] + [value for _, value in dimensions])
+        return self.alarm_prefix + re.sub(r'[^A-Za-z0-9_.\-/]', '_', name)
+
+    def push_thresholds(self):
+        """
+        put_metric_alarm for every metric whose threshold drifted
+        returns (alarm name, threshold) for each alarm pushed
+        """
+        pushed = []
+        for metric in self.metrics:
+            key = self._metric_key(metric)
+            if self.stats[key].count < self.min_samples:
+                continue
+            threshold = self.threshold(key)
+            previous = self.pushed.get(key)
+            if previous is not None and \
+                    abs(threshold - previous) <= self.drift * max(abs(previous), 1e-9):
+                continue
+
+            alarm_name = self.alarm_name(key)
+            self.cloudwatch.put_metric_alarm(
+                AlarmName=alarm_name,
+                ComparisonOperator='GreaterThanThreshold',
+                EvaluationPeriods=1,
+                MetricName=metric['MetricName'],
+                Namespace=metric['Namespace'],
+                Period=self.period,
+                Statistic=self.statistic,
+                Threshold=threshold,
+                ActionsEnabled=False,
+                AlarmDescription=f'adaptive threshold: max(mean + {self.k} * stddev, '
+                                 f'p{self.quantile * 100:g})',
+                Dimensions=metric.get('Dimensions', [])
+            )
+            self.api_calls += 1
+            self.pushed[key] = threshold
+            pushed.append((alarm_name, threshold))
+        return pushed
+
+    def run(self, interval=60, iterations=None, rediscover_every=10):
+        """
+        poll and push every interval seconds; runs forever unless iterations is given
+        """
+        i = 0
+        while iterations is None or i < iterations:
+            if i % rediscover_every == 0:
+                self.discover()
+            self.poll()
+            for alarm_name, threshold in self.push_thresholds():
+                print(f'updated {alarm_name} threshold to {threshold:.2f}')
+            i += 1
+            if iterations is None or i < iterations:
+                time.sleep(interval)
+
+
+if __name__ == '__main__':
+    detector = MetricAnomalyDetector()
+    detector.run()
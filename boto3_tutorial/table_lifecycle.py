@@ -0,0 +1,239 @@
+"""
+concurrent DynamoDB table lifecycle for test and batch jobs
+
+instead of creating tables one at a time and blocking on get_waiter('table_exists'),
+ensure_tables creates (or reuses) many tables at once and polls describe_table
+asynchronously with an adaptive interval: short at first, backing off while the table
+is still being created
+existing tables whose key schema matches are reused (stream and billing settings updated)
+rather than deleted and recreated; their items are kept unless truncate=True, which deletes
+every item with a parallel scan, so only pass it for tables holding disposable test data
+other existing tables are only replaced on request
+for more on table status see:
+https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb.html#DynamoDB.Client.describe_table
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+from dynamoDB import users_table_spec
+
+
+def on_demand(spec, read_units_per_second=None, write_units_per_second=None):
+    """
+    turn a create_table spec into a PAY_PER_REQUEST one; passing units pre-warms the
+    table so it can serve that throughput immediately instead of scaling up to it
+    for more on warm throughput see:
+    https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/warm-throughput.html
+    """
+    spec = dict(spec)
+    spec.pop('ProvisionedThroughput', None)
+    spec['BillingMode'] = 'PAY_PER_REQUEST'
+    warm = {}
+    if read_units_per_second:
+        warm['ReadUnitsPerSecond'] = read_units_per_second
+    if write_units_per_second:
+        warm['WriteUnitsPerSecond'] = write_units_per_second
+    if warm:
+        spec['WarmThroughput'] = warm
+    return spec
+
+
+async def _call(func, **kargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, **kargs))
+
+
+async def wait_for_table(client, table_name, exists=True, initial=0.25, maximum=5.0,
+                         factor=1.5, timeout=600):
+    """
+    poll describe_table until table_name is ACTIVE (exists=True) or gone (exists=False)
+    the interval starts at initial and grows by factor up to maximum
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    interval = initial
+    while True:
+        try:
+            table = (await _call(client.describe_table, TableName=table_name))['Table']
+        except client.exceptions.ResourceNotFoundException:
+            table = None
+
+        if exists and table and table['TableStatus'] == 'ACTIVE':
+            return table
+        if not exists and table is None:
+            return None
+        if loop.time() + interval > deadline:
+            raise TimeoutError(f'table "{table_name}" not {"ACTIVE" if exists else "deleted"} '
+                               f'after {timeout}s')
+        await asyncio.sleep(interval)
+        interval = min(interval * factor, maximum)
+
+
+def _schema_matches(table, spec):
+    def attrs(definitions):
+        return {(d['AttributeName'], d['AttributeType']) for d in definitions}
+
+    return (table['KeySchema'] == spec['KeySchema']
+            and attrs(table['AttributeDefinitions']) == attrs(spec['AttributeDefinitions']))
+
+
+def _truncate_segment(table, key_names, segment, total_segments):
+    names = {f'#k{i}': name for i, name in enumerate(key_names)}
+    kargs = {
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names,
+        'Segment': segment,
+        'TotalSegments': total_segments
+    }
+    deleted = 0
+    with table.batch_writer() as batch:
+        while True:
+            response = table.scan(**kargs)
+            for key in response['Items']:
+                batch.delete_item(Key=key)
+                deleted += 1
+            if 'LastEvaluatedKey' not in response:
+                return deleted
+            kargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def truncate_table(table_name, total_segments=4):
+    """
+    delete every item of table_name with a parallel segmented key-only scan
+    returns number of deleted items
+    """
+    dynamodb = boto3.resource('dynamodb')
+    table = dynamodb.Table(table_name)
+    key_names = [k['AttributeName'] for k in table.key_schema]
+
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        futures = [executor.submit(_truncate_segment, table, key_names, segment, total_segments)
+                   for segment in range(total_segments)]
+        return sum(future.result() for future in futures)
+
+
+def _capacity_update(table, spec):
+    """
+    update_table arguments needed to bring an existing table's billing settings in line with spec
+    """
+    update = {}
+    billing_mode = spec.get('BillingMode', 'PROVISIONED')
+    current_mode = table.get('BillingModeSummary', {}).get('BillingMode', 'PROVISIONED')
+    if billing_mode != current_mode:
+        update['BillingMode'] = billing_mode
+    if billing_mode == 'PROVISIONED':
+        current = table.get('ProvisionedThroughput', {})
+        wanted = spec['ProvisionedThroughput']
+        if (current.get('ReadCapacityUnits'), current.get('WriteCapacityUnits')) != \
+                (wanted['ReadCapacityUnits'], wanted['WriteCapacityUnits']):
+            update['ProvisionedThroughput'] = wanted
+    if 'WarmThroughput' in spec:
+        current = table.get('WarmThroughput', {})
+        if any(current.get(k, 0) < v for k, v in spec['WarmThroughput'].items()):
+            update['WarmThroughput'] = spec['WarmThroughput']
+    return update
+
+
+def _stream_updates(table, spec):
+    """
+    StreamSpecification updates that bring the table's stream in line with spec;
+    a different view type needs the stream disabled first
+    """
+    current = table.get('StreamSpecification', {'StreamEnabled': False})
+    wanted = spec.get('StreamSpecification', {'StreamEnabled': False})
+    if not wanted['StreamEnabled']:
+        return [{'StreamEnabled': False}] if current['StreamEnabled'] else []
+    if not current['StreamEnabled']:
+        return [wanted]
+    if current['StreamViewType'] != wanted['StreamViewType']:
+        return [{'StreamEnabled': False}, wanted]
+    return []
+
+
+async def _ensure_table(client, spec, reuse, truncate, recreate):
+    table_name = spec['TableName']
+    try:
+        table = (await _call(client.describe_table, TableName=table_name))['Table']
+    except client.exceptions.ResourceNotFoundException:
+        table = None
+
+    if table is not None:
+        if table['TableStatus'] == 'DELETING':
+            await wait_for_table(client, table_name, exists=False)
+        elif reuse and _schema_matches(table, spec):
+            table = await wait_for_table(client, table_name)
+            deleted = await _call(truncate_table, table_name=table_name) if truncate else 0
+            updates = [{'StreamSpecification': stream} for stream in _stream_updates(table, spec)]
+            capacity = _capacity_update(table, spec)
+            if capacity:
+                updates.append(capacity)
+            # one change per update_table call, each applied once the table is ACTIVE again
+            for update in updates:
+                await _call(client.update_table, TableName=table_name, **update)
+                await wait_for_table(client, table_name)
+            truncated = f' ({deleted} items truncated)' if truncate else ''
+            print(f'reused table {table_name}{truncated}')
+            return 'reused'
+        elif recreate:
+            await _call(client.delete_table, TableName=table_name)
+            await wait_for_table(client, table_name, exists=False)
+        else:
+            reason = 'has a different key schema' if reuse else 'already exists'
+            raise ValueError(f'table "{table_name}" {reason}; pass recreate=True to delete '
+                             f'and recreate it')
+
+    await _call(client.create_table, **spec)
+    await wait_for_table(client, table_name)
+    print(f'created table {table_name}')
+    return 'created'
+
+
+async def ensure_tables_async(specs, reuse=True, truncate=False, recreate=False):
+    """
+    create or reuse every table in specs (create_table argument dicts) concurrently
+    an existing table is reused (stream and billing settings updated) when reuse is set and
+    its key schema matches, and emptied first if truncate is set; otherwise it is only deleted
+    and recreated with recreate=True, and ValueError is raised instead
+    returns {table_name: 'created' | 'reused'}
+    """
+    client = boto3.client('dynamodb')
+    results = await asyncio.gather(*(_ensure_table(client, spec, reuse, truncate, recreate)
+                                     for spec in specs))
+    return {spec['TableName']: result for spec, result in zip(specs, results)}
+
+
+def ensure_tables(specs, reuse=True, truncate=False, recreate=False):
+    return asyncio.run(ensure_tables_async(specs, reuse, truncate, recreate))
+
+
+async def delete_tables_async(table_names):
+    """
+    delete table_names concurrently and wait until they are all gone
+    """
+    client = boto3.client('dynamodb')
+
+    async def delete(table_name):
+        try:
+            await _call(client.delete_table, TableName=table_name)
+        except client.exceptions.ResourceNotFoundException:
+            return
+        await wait_for_table(client, table_name, exists=False)
+
+    await asyncio.gather(*(delete(table_name) for table_name in table_names))
+
+
+def delete_tables(table_names):
+    asyncio.run(delete_tables_async(table_names))
+
+
+if __name__ == '__main__':
+    prefix = input('enter prefix of tables to create: ')
+    specs = [on_demand(users_table_spec(f'{prefix}_{i}'), read_units_per_second=12000)
+             for i in range(4)]
+    print(ensure_tables(specs))
+    print(ensure_tables(specs, truncate=True))
+    delete_tables([spec['TableName'] for spec in specs])